@@ -11,6 +11,7 @@ def main():
     # Check required files
     required_files = [
         'telegram_post_bot.py',
+        'media_workers.py',
         'requirements.txt',
         'cerebrium.toml'
     ]
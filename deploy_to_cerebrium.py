@@ -17,6 +17,7 @@ def create_deployment_package():
     # Файлы для деплоя
     files_to_include = [
         'telegram_post_bot.py',
+        'media_workers.py',
         'requirements.txt',
         'cerebrium.toml'
     ]
@@ -0,0 +1,88 @@
+"""
+Функции фоновой обработки медиа, выполняемые в пуле процессов.
+
+Модуль намеренно не импортирует telegram, flask и httpx и ничего не делает
+при импорте: его загружает каждый процесс пула MediaPostProcessor.
+"""
+import hashlib
+import json
+import os
+import subprocess
+
+
+def file_sha256(path: str) -> str:
+    """Считает SHA-256 файла блоками"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def recompress_photo(path: str, photo_format: str, quality: int) -> dict:
+    """Перекодирует фото в более компактный формат рядом с оригиналом.
+
+    Если новый файл не меньше оригинала, он удаляется. Иначе в результате
+    есть ключи file, size и sha256 нового файла; оригинал удаляет вызывающий
+    код после того, как метаданные поста начнут указывать на новый файл.
+    """
+    from PIL import Image
+
+    base_name = os.path.splitext(path)[0]
+    optimized_path = f"{base_name}.{photo_format}"
+    if optimized_path == path or os.path.exists(optimized_path):
+        optimized_path = f"{base_name}_optimized.{photo_format}"
+
+    with Image.open(path) as image:
+        result = {'width': image.width, 'height': image.height}
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        image.save(optimized_path, quality=quality, optimize=True)
+
+    original_size = os.path.getsize(path)
+    optimized_size = os.path.getsize(optimized_path)
+    if optimized_size >= original_size:
+        # Перекодирование не дало выигрыша - оставляем оригинал
+        os.remove(optimized_path)
+        return result
+
+    result.update({
+        'file': os.path.basename(optimized_path),
+        'size': optimized_size,
+        'sha256': file_sha256(optimized_path),
+        'original_file': os.path.basename(path),
+        'original_size': original_size,
+    })
+    return result
+
+
+def probe_video(path: str, frames: int, preview_width: int) -> dict:
+    """Извлекает длительность и разрешение видео и кадры превью"""
+    probe = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-print_format', 'json',
+         '-show_entries', 'format=duration:stream=width,height,codec_name', path],
+        capture_output=True, text=True, timeout=60, check=True,
+    )
+    info = json.loads(probe.stdout or '{}')
+    stream = (info.get('streams') or [{}])[0]
+    duration = float(info.get('format', {}).get('duration') or 0)
+    result = {
+        'duration': duration,
+        'width': stream.get('width'),
+        'height': stream.get('height'),
+        'codec': stream.get('codec_name'),
+        'previews': [],
+    }
+
+    base_name = os.path.splitext(path)[0]
+    for index in range(frames if duration else 0):
+        # Кадры равномерно по длительности, не с самого начала и не с конца
+        timestamp = duration * (index + 1) / (frames + 1)
+        preview_path = f"{base_name}_preview_{index + 1}.jpg"
+        subprocess.run(
+            ['ffmpeg', '-v', 'error', '-y', '-ss', f"{timestamp:.2f}", '-i', path,
+             '-frames:v', '1', '-vf', f"scale={preview_width}:-2", preview_path],
+            capture_output=True, timeout=60, check=True,
+        )
+        result['previews'].append(os.path.basename(preview_path))
+    return result
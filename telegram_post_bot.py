@@ -1,33 +1,59 @@
+import time
+# Точка отсчета профиля запуска - до импорта остальных модулей
+_STARTUP_STARTED = time.perf_counter()
+
 import os
 import logging
 import asyncio
 import nest_asyncio
-import time
 import threading
 import signal
 import sys
+import importlib.util
+import hashlib
+import gzip
+import shutil
+import contextlib
+import contextvars
+import functools
+import hmac
+from collections import Counter, deque
+import json
+import math
+from pathlib import Path
 from datetime import datetime
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import httpx
+from telegram import (Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, InputMediaVideo,
+                      InputMediaDocument, InputMediaAudio)
+from telegram.constants import ParseMode
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
-from telegram.error import Conflict, RetryAfter, TimedOut, BadRequest
+from telegram.error import Conflict, RetryAfter, TimedOut, BadRequest, NetworkError, TelegramError
+from telegram.request import HTTPXRequest
 from dotenv import load_dotenv
-from flask import Flask, render_template_string, jsonify
+from flask import Flask, Response, jsonify, request
+
+from media_workers import file_sha256, recompress_photo, probe_video
 
-# Apply nest_asyncio to handle event loop issues
-nest_asyncio.apply()
+# Процессы пула MediaPostProcessor (spawn) импортируют этот модуль как __mp_main__.
+# Им не нужны ни event loop бота, ни логи в bot.log, ни обработчики сигналов.
+_IS_POOL_WORKER = __name__ == '__mp_main__'
 
-# Загружаем переменные окружения
-load_dotenv()
+if not _IS_POOL_WORKER:
+    # Apply nest_asyncio to handle event loop issues
+    nest_asyncio.apply()
 
-# Настройка логирования с более подробной информацией
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.StreamHandler(),  # Вывод в консоль
-        logging.FileHandler('bot.log', encoding='utf-8')  # Логи в файл
-    ]
-)
+    # Загружаем переменные окружения
+    load_dotenv()
+
+    # Настройка логирования с более подробной информацией
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO,
+        handlers=[
+            logging.StreamHandler(),  # Вывод в консоль
+            logging.FileHandler('bot.log', encoding='utf-8')  # Логи в файл
+        ]
+    )
 
 # Глобальный logger для использования во всем приложении
 logger = logging.getLogger(__name__)
@@ -37,11 +63,1088 @@ bot_instance = None
 shutdown_event = threading.Event()
 
 
+class StartupProfile:
+    """Отметки времени этапов запуска относительно начала импорта модуля"""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.marks = []
+
+    def mark(self, name: str):
+        elapsed = time.perf_counter() - self.started
+        self.marks.append((name, elapsed))
+        logger.info(f"⏱️ Запуск: {name} за {elapsed * 1000:.0f}ms")
+
+    def as_dict(self) -> dict:
+        return {
+            'marks': [{'name': name, 'elapsed_ms': round(elapsed * 1000)} for name, elapsed in self.marks],
+            'total_ms': round(self.marks[-1][1] * 1000) if self.marks else None,
+        }
+
+
+startup_profile = StartupProfile(_STARTUP_STARTED)
+if not _IS_POOL_WORKER:
+    startup_profile.mark("imports")
+
+
+class Tracer:
+    """Замеры времени обработчиков обновлений по отдельным этапам (span).
+
+    Каждый обработчик из create_application оборачивается в wrap_handler.
+    Внутри обработчика ``with tracer.span("get_file"):`` добавляет этап в
+    текущую трассу; трасса определяется через contextvars, поэтому этапы из
+    задач asyncio.gather и asyncio.to_thread попадают в трассу обработчика.
+    Готовые трассы хранятся в кольцевом буфере.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_ms = 2000
+        self.traces = deque(maxlen=200)
+        self._current = contextvars.ContextVar('trace', default=None)
+
+    def configure(self, enabled: bool, buffer_size: int, slow_ms: float):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.traces = deque(self.traces, maxlen=max(buffer_size, 1))
+
+    def wrap_handler(self, handler):
+        """Оборачивает callback обработчика PTB замером времени"""
+        original = handler.callback
+        name = getattr(original, '__name__', type(handler).__name__)
+
+        @functools.wraps(original)
+        async def traced(update, context):
+            if not self.enabled:
+                return await original(update, context)
+            trace = {
+                'handler': name,
+                'update_id': getattr(update, 'update_id', None),
+                'started': datetime.now().isoformat(timespec='milliseconds'),
+                'spans': [],
+                '_t0': time.perf_counter(),
+            }
+            token = self._current.set(trace)
+            try:
+                return await original(update, context)
+            except Exception as e:
+                trace['error'] = repr(e)
+                raise
+            finally:
+                self._current.reset(token)
+                self._finish(trace)
+
+        handler.callback = traced
+
+    def _finish(self, trace: dict):
+        trace['duration_ms'] = round((time.perf_counter() - trace['_t0']) * 1000, 1)
+        self.traces.append(trace)
+        if trace['duration_ms'] >= self.slow_ms:
+            spans = ", ".join(f"{span['name']}={span['duration_ms']:.0f}ms" for span in trace['spans'])
+            logger.warning(f"Медленный обработчик {trace['handler']}: {trace['duration_ms']:.0f}ms ({spans})")
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        """Замеряет этап внутри текущего обработчика"""
+        trace = self._current.get()
+        if trace is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            trace['spans'].append({
+                'name': name,
+                'start_ms': round((started - trace['_t0']) * 1000, 1),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            })
+
+    def snapshot(self) -> list:
+        # Вызывается из потока Flask, пока цикл бота дописывает буфер: сначала копия,
+        # итерация по самому deque упала бы с RuntimeError
+        return [{key: list(value) if key == 'spans' else value for key, value in trace.items() if key != '_t0'}
+                for trace in list(self.traces)]
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик всех потоков процесса.
+
+    Раз в interval секунд снимает стеки через sys._current_frames() и пишет
+    результат в формате folded stacks (``поток;функция;функция N``), который
+    читают flamegraph.pl, speedscope и inferno.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+        self.current_file = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval: float, output_dir: str) -> str:
+        """Запускает профилирование в фоне и возвращает путь к будущему файлу"""
+        with self._lock:
+            if self.running:
+                raise RuntimeError(f"профилирование уже идет: {self.current_file}")
+            os.makedirs(output_dir, exist_ok=True)
+            path = os.path.join(output_dir, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.folded")
+            self.current_file = path
+            self._thread = threading.Thread(target=self._run, args=(seconds, interval, path),
+                                            name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return path
+
+    def _run(self, seconds: float, interval: float, path: str):
+        own_id = threading.get_ident()
+        counts = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not shutdown_event.is_set():
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                counts[";".join(reversed(stack))] += 1
+            samples += 1
+            time.sleep(interval)
+
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Профиль сохранен: {path} ({samples} срезов)")
+
+
+tracer = Tracer()
+profiler = SamplingProfiler()
+
+
+def _env_int(name: str, default: int) -> int:
+    """Читает целочисленную переменную окружения"""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        logger.warning(f"Некорректное значение {name}, используем {default}")
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Читает дробную переменную окружения"""
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        logger.warning(f"Некорректное значение {name}, используем {default}")
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Читает логическую переменную окружения"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class BotConfig:
+    """Настройки бота из переменных окружения"""
+
+    def __init__(self):
+        # Пул для обычных вызовов Bot API (sendMessage, getFile и т.д.)
+        self.api_pool_size = _env_int('API_POOL_SIZE', 16)
+        self.api_connect_timeout = _env_float('API_CONNECT_TIMEOUT', 10)
+        self.api_read_timeout = _env_float('API_READ_TIMEOUT', 15)
+        self.api_write_timeout = _env_float('API_WRITE_TIMEOUT', 15)
+        self.api_pool_timeout = _env_float('API_POOL_TIMEOUT', 5)
+
+        # Отдельный пул для long-polling getUpdates
+        self.get_updates_pool_size = _env_int('GET_UPDATES_POOL_SIZE', 2)
+        self.get_updates_read_timeout = _env_float('GET_UPDATES_READ_TIMEOUT', 30)
+        self.get_updates_write_timeout = _env_float('GET_UPDATES_WRITE_TIMEOUT', 30)
+
+        # Отдельный пул для скачивания файлов
+        self.download_pool_size = _env_int('DOWNLOAD_POOL_SIZE', 8)
+        self.download_keepalive = _env_int('DOWNLOAD_KEEPALIVE', 8)
+        self.download_keepalive_expiry = _env_float('DOWNLOAD_KEEPALIVE_EXPIRY', 30)
+        self.download_connect_timeout = _env_float('DOWNLOAD_CONNECT_TIMEOUT', 10)
+        self.download_read_timeout = _env_float('DOWNLOAD_READ_TIMEOUT', 30)
+        self.download_base_timeout = _env_float('DOWNLOAD_BASE_TIMEOUT', 20)
+        self.download_min_speed_kbps = _env_float('DOWNLOAD_MIN_SPEED_KBPS', 256)
+        # Докачка больших файлов по частям
+        self.download_chunk_size = _env_int('DOWNLOAD_CHUNK_KB', 256) * 1024
+        self.download_buffer_size = _env_int('DOWNLOAD_BUFFER_KB', 1024) * 1024
+        self.download_retries = _env_int('DOWNLOAD_RETRIES', 5)
+        self.download_backoff_base = _env_float('DOWNLOAD_BACKOFF_BASE', 1)
+        self.download_backoff_max = _env_float('DOWNLOAD_BACKOFF_MAX', 30)
+
+        # Сколько обновлений обрабатывается параллельно
+        self.concurrent_updates = _env_int('CONCURRENT_UPDATES', 4)
+
+        # Собственный сервер Bot API (https://github.com/tdlib/telegram-bot-api)
+        self.api_url = os.getenv('TELEGRAM_API_URL', '').rstrip('/')
+        self.local_mode = _env_bool('TELEGRAM_LOCAL_MODE', bool(self.api_url))
+        # Как забирать файлы из хранилища сервера: link (жесткая ссылка), move или copy
+        self.local_ingest = os.getenv('LOCAL_API_INGEST', 'link').strip().lower()
+        if self.local_ingest not in ('link', 'move', 'copy'):
+            logger.warning(f"Неизвестный режим LOCAL_API_INGEST={self.local_ingest}, используем link")
+            self.local_ingest = 'link'
+        # Путь к хранилищу сервера и путь, под которым оно смонтировано у бота:
+        # "/var/lib/telegram-bot-api:/data/bot-api"
+        self.local_path_map = None
+        path_map = os.getenv('LOCAL_API_PATH_MAP', '')
+        if ':' in path_map:
+            server_prefix, local_prefix = path_map.split(':', 1)
+            self.local_path_map = (server_prefix.rstrip('/'), local_prefix.rstrip('/'))
+
+        # Публичный Bot API отдает через getFile файлы до 50MB, локальный - до 2000MB
+        self.max_file_size_mb = _env_float('MAX_FILE_SIZE_MB', 2000 if self.local_mode else 50)
+
+        # Фоновая обработка медиа в пуле процессов
+        self.postprocess_enabled = _env_bool('POSTPROCESS_ENABLED', False)
+        self.postprocess_workers = max(_env_int('POSTPROCESS_WORKERS', os.cpu_count() or 1), 1)
+        self.photo_format = os.getenv('PHOTO_FORMAT', 'webp').strip().lower()
+        self.photo_quality = _env_int('PHOTO_QUALITY', 80)
+        self.preview_frames = _env_int('PREVIEW_FRAMES', 3)
+        self.preview_width = _env_int('PREVIEW_WIDTH', 320)
+
+        # Публикация одобренных постов в канал
+        self.channel_id = os.getenv('CHANNEL_ID', '').strip()
+        self.publish_admin_ids = {int(user_id) for user_id in os.getenv('PUBLISH_ADMIN_IDS', '').split(',')
+                                  if user_id.strip().isdigit()}
+        # Токен для изменяющих запросов веб-интерфейса; без него такие запросы отклоняются
+        self.web_admin_token = os.getenv('WEB_ADMIN_TOKEN', '').strip()
+        # Telegram допускает около 20 сообщений в минуту в одну группу или канал
+        self.publish_rate_per_minute = _env_float('PUBLISH_RATE_PER_MINUTE', 20)
+        # Не меньше размера альбома, чтобы альбом из 10 файлов помещался в корзину целиком
+        self.publish_burst = max(_env_int('PUBLISH_BURST', 10), ChannelPublisher.MEDIA_GROUP_LIMIT)
+        self.publish_poll_interval = _env_float('PUBLISH_POLL_INTERVAL', 5)
+        self.publish_max_attempts = _env_int('PUBLISH_MAX_ATTEMPTS', 5)
+        # Таймауты загрузки в канал: запись растет с размером файлов, чтение
+        # покрывает обработку уже загруженных файлов на стороне Telegram
+        self.publish_upload_base_timeout = _env_float('PUBLISH_UPLOAD_BASE_TIMEOUT', 30)
+        self.publish_upload_min_speed_kbps = _env_float('PUBLISH_UPLOAD_MIN_SPEED_KBPS', 256)
+        self.publish_read_timeout = _env_float('PUBLISH_READ_TIMEOUT', 120)
+
+        # Пробы для Docker/Cerebrium
+        self.ready_poll_staleness = _env_float('READY_POLL_STALENESS', 60)
+        self.ready_max_queue_depth = _env_int('READY_MAX_QUEUE_DEPTH', 0)
+        self.health_loop_stall = _env_float('HEALTH_LOOP_STALL', 30)
+
+        # Трассировка обработчиков и профилирование
+        self.tracing_enabled = _env_bool('TRACING_ENABLED', False)
+        self.trace_buffer_size = _env_int('TRACE_BUFFER_SIZE', 200)
+        self.slow_handler_ms = _env_float('SLOW_HANDLER_MS', 2000)
+        self.profile_dir = os.getenv('PROFILE_DIR', 'profiles')
+        self.profile_interval = _env_float('PROFILE_INTERVAL_MS', 10) / 1000
+        self.profile_max_seconds = _env_float('PROFILE_MAX_SECONDS', 120)
+
+        self.http2 = _env_bool('HTTP2_ENABLED', False)
+        if self.http2 and importlib.util.find_spec('h2') is None:
+            logger.warning("HTTP2_ENABLED=1, но пакет h2 не установлен. Используем HTTP/1.1")
+            self.http2 = False
+
+    @property
+    def http_version(self) -> str:
+        return "2" if self.http2 else "1.1"
+
+    def download_timeout(self, file_size: int) -> float:
+        """Общий таймаут скачивания, пропорциональный размеру файла"""
+        min_speed = max(self.download_min_speed_kbps, 1) * 1024
+        return self.download_base_timeout + (file_size or 0) / min_speed
+
+    def upload_timeout(self, total_size: int) -> float:
+        """Таймаут записи при отправке файлов в канал, пропорциональный их размеру"""
+        min_speed = max(self.publish_upload_min_speed_kbps, 1) * 1024
+        return self.publish_upload_base_timeout + (total_size or 0) / min_speed
+
+
+class TrackedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest, запоминающий время последнего успешного ответа сервера"""
+
+    def __init__(self, *args, name: str = "request", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+        self.last_success = None
+        self.last_error = None
+
+    async def do_request(self, *args, **kwargs):
+        try:
+            code, payload = await super().do_request(*args, **kwargs)
+        except Exception as e:
+            self.last_error = repr(e)
+            raise
+        if 200 <= code < 300:
+            if self.last_success is None:
+                startup_profile.mark(f"first {self.name}")
+            self.last_success = time.monotonic()
+        else:
+            self.last_error = f"HTTP {code}"
+        return code, payload
+
+
+class DownloadError(Exception):
+    """Файл не удалось скачать целиком"""
+
+
+class ResumableDownload:
+    """Скачивание файла по частям с докачкой через HTTP Range.
+
+    Данные пишутся во временный файл ``<destination>.part`` через буфер
+    ограниченного размера, SHA-256 считается на лету. После обрыва соединения
+    повторный запрос продолжает с последнего записанного байта, поэтому
+    сбой посреди 50MB видео стоит только недокачанного остатка.
+    """
+
+    # Ошибки сервера, после которых имеет смысл повторить запрос
+    RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+    def __init__(self, client: httpx.AsyncClient, url: str, destination: str,
+                 file_size: int, config: BotConfig):
+        self.client = client
+        self.url = url
+        self.destination = destination
+        self.part_path = destination + ".part"
+        self.file_size = file_size or 0
+        self.config = config
+        self.offset = 0
+        self.hasher = hashlib.sha256()
+        self._file = None
+        self._pending_write = None
+
+    async def run(self) -> str:
+        """Скачивает файл и возвращает SHA-256 его содержимого"""
+        config = self.config
+        attempt = 0
+        self._file = open(self.part_path, 'wb')
+        try:
+            while True:
+                remaining = max(self.file_size - self.offset, 0)
+                try:
+                    await asyncio.wait_for(self._fetch_range(),
+                                           timeout=config.download_timeout(remaining))
+                    if not self.file_size or self.offset >= self.file_size:
+                        break
+                    # Сервер закрыл соединение раньше времени - докачиваем остаток
+                    raise DownloadError(f"получено {self.offset} из {self.file_size} байт")
+                except (httpx.TransportError, asyncio.TimeoutError, DownloadError) as e:
+                    error = e
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code not in self.RETRY_STATUSES:
+                        raise
+                    error = e
+
+                attempt += 1
+                if attempt > config.download_retries:
+                    raise DownloadError(
+                        f"не удалось скачать файл за {attempt} попыток: {error!r}") from error
+                delay = min(config.download_backoff_base * 2 ** (attempt - 1), config.download_backoff_max)
+                logger.warning(f"Обрыв загрузки на {self.offset} байт ({error!r}). "
+                               f"Повтор №{attempt} через {delay:.0f} сек...")
+                await asyncio.sleep(delay)
+        except BaseException:
+            self._file.close()
+            if os.path.exists(self.part_path):
+                os.remove(self.part_path)
+            raise
+
+        await self._wait_pending_write()
+        self._file.close()
+        self._verify_size()
+        os.replace(self.part_path, self.destination)
+        return self.hasher.hexdigest()
+
+    async def _fetch_range(self):
+        """Запрашивает файл начиная с текущего смещения и дописывает данные"""
+        if self.offset:
+            # Файл на диске должен в точности соответствовать offset
+            await self._wait_pending_write()
+            await asyncio.to_thread(self._truncate_to_offset)
+        headers = {'Range': f'bytes={self.offset}-'} if self.offset else None
+        async with self.client.stream("GET", self.url, headers=headers) as response:
+            if self.offset and response.status_code == 200:
+                # Сервер проигнорировал Range - начинаем с начала
+                logger.warning("Сервер не поддерживает докачку, загружаем файл заново")
+                await self._restart()
+            elif self.offset and response.status_code == 416 and self.offset == self.file_size:
+                return
+            elif self.offset and response.status_code == 206:
+                start = self._range_start(response)
+                if start != self.offset:
+                    # Ответ не с того байта: дописав его, мы испортили бы файл, а при
+                    # известном file_size проверка размера этого бы не заметила
+                    logger.warning(f"Сервер вернул Content-Range "
+                                   f"{response.headers.get('Content-Range')!r} вместо {self.offset}-, "
+                                   f"загружаем файл заново")
+                    await self._restart()
+                    if start != 0:
+                        raise DownloadError("неверный Content-Range при докачке")
+            response.raise_for_status()
+
+            buffer = bytearray()
+            try:
+                async for chunk in response.aiter_bytes(self.config.download_chunk_size):
+                    buffer += chunk
+                    if len(buffer) >= self.config.download_buffer_size:
+                        await self._flush(buffer)
+            finally:
+                # Уже полученные байты корректны даже при обрыве - сохраняем их
+                if buffer:
+                    await self._flush(buffer)
+
+    @staticmethod
+    def _range_start(response):
+        """Первый байт из Content-Range вида 'bytes 100-199/200' или None"""
+        value = response.headers.get('Content-Range', '')
+        unit, _, byte_range = value.strip().partition(' ')
+        start = byte_range.split('-', 1)[0]
+        if unit.lower() != 'bytes' or not start.isdigit():
+            return None
+        return int(start)
+
+    async def _flush(self, buffer: bytearray):
+        """Пишет буфер на диск вне event loop и очищает его"""
+        data = bytes(buffer)
+        buffer.clear()
+        # Учитываем данные до await: если таймаут отменит задачу, запись в потоке
+        # все равно завершится, и offset с хешем уже будут ей соответствовать
+        self.hasher.update(data)
+        self.offset += len(data)
+        self._pending_write = asyncio.ensure_future(asyncio.to_thread(self._file.write, data))
+        await asyncio.shield(self._pending_write)
+        if self.file_size and self.offset > self.file_size:
+            raise DownloadError(f"получено больше данных, чем ожидалось ({self.offset} > {self.file_size})")
+
+    async def _wait_pending_write(self):
+        """Дожидается записи, начатой до отмены по таймауту"""
+        if self._pending_write is not None:
+            await self._pending_write
+            self._pending_write = None
+
+    def _truncate_to_offset(self):
+        self._file.seek(self.offset)
+        self._file.truncate()
+
+    async def _restart(self):
+        """Сбрасывает уже скачанные данные"""
+        self.hasher = hashlib.sha256()
+        self.offset = 0
+        await asyncio.to_thread(self._truncate_to_offset)
+
+    def _verify_size(self):
+        """Сверяет размер скачанного файла с file_size из Telegram"""
+        actual_size = os.path.getsize(self.part_path)
+        if self.file_size and actual_size != self.file_size:
+            os.remove(self.part_path)
+            raise DownloadError(f"размер файла {actual_size} не совпадает с ожидаемым {self.file_size}")
+
+
+class MediaSkipped(Exception):
+    """Файл не прошел проверку и не будет сохранен"""
+
+
+class MediaSpec:
+    """Описание типа медиа: откуда взять файл в сообщении и как его назвать"""
+
+    def __init__(self, kind: str, label: str, default_name: str, extensions: dict = None):
+        self.kind = kind
+        self.label = label
+        self.default_name = default_name
+        # Расширение по признаку объекта, например анимированный стикер -> .tgs
+        self.extensions = extensions or {}
+
+    def extract(self, message):
+        """Возвращает медиа объект из сообщения или None"""
+        media = getattr(message, self.kind, None)
+        if self.kind == 'photo':
+            # Берем фото в максимальном качестве
+            return media[-1] if media else None
+        return media
+
+    def file_name(self, media) -> str:
+        """Имя файла в папке поста"""
+        file_name = getattr(media, 'file_name', None)
+        if file_name:
+            return file_name
+        base_name, ext = os.path.splitext(self.default_name)
+        for attr, attr_ext in self.extensions.items():
+            if getattr(media, attr, False):
+                ext = attr_ext
+                break
+        return base_name + ext
+
+
+# Поддерживаемые типы медиа в порядке обработки
+MEDIA_TYPES = [
+    MediaSpec('photo', 'фото', 'photo.jpg'),
+    MediaSpec('video', 'видео', 'video.mp4'),
+    MediaSpec('animation', 'GIF', 'animation.gif'),
+    MediaSpec('document', 'файл', 'document.bin'),
+    MediaSpec('audio', 'аудио', 'audio.mp3'),
+    MediaSpec('voice', 'голосовое', 'voice.ogg'),
+    MediaSpec('video_note', 'видеосообщение', 'video_note.mp4'),
+    MediaSpec('sticker', 'стикер', 'sticker.webp', {'is_animated': '.tgs', 'is_video': '.webm'}),
+]
+
+
+class MediaItem:
+    """Состояние одного файла при прохождении через MediaPipeline"""
+
+    def __init__(self, spec: MediaSpec, media, post_dir: str):
+        self.spec = spec
+        self.media = media
+        self.post_dir = post_dir
+        self.file_name = spec.file_name(media)
+        self.file_size = media.file_size or 0
+        self.path = None
+        self.sha256 = None
+        self.metadata = {}
+        self.timings = {}
+        self.notice = None  # Строка для ответа пользователю при пропуске или ошибке
+
+    @property
+    def size_mb(self) -> float:
+        return self.file_size / (1024 * 1024)
+
+    @property
+    def saved_name(self):
+        return os.path.basename(self.path) if self.path and os.path.exists(self.path) else None
+
+    @property
+    def display_name(self) -> str:
+        if getattr(self.media, 'file_name', None):
+            return f"{self.spec.label} '{self.file_name}'"
+        return self.spec.label
+
+
+class MediaPipeline:
+    """Последовательность стадий обработки медиа файла.
+
+    Стадия - корутина ``stage(item)``. Она может выбросить MediaSkipped, чтобы
+    остановить обработку файла без ошибки. Время каждой стадии пишется в
+    ``item.timings``.
+    """
+
+    def __init__(self, stages=None, concurrency: int = 4):
+        self.stages = list(stages or [])
+        self.concurrency = concurrency
+
+    def add_stage(self, name: str, stage, before: str = None):
+        """Добавляет стадию в конец или перед стадией с именем before"""
+        if before is None:
+            self.stages.append((name, stage))
+            return
+        index = [stage_name for stage_name, _ in self.stages].index(before)
+        self.stages.insert(index, (name, stage))
+
+    async def run(self, item: MediaItem) -> MediaItem:
+        label = item.display_name
+        try:
+            for name, stage in self.stages:
+                started = time.perf_counter()
+                try:
+                    with tracer.span(f"{name}:{item.spec.kind}"):
+                        await stage(item)
+                finally:
+                    item.timings[name] = time.perf_counter() - started
+            logger.info(f"Успешно загружено: {label} ({item.size_mb:.1f}MB)")
+        except MediaSkipped as e:
+            logger.warning(f"Пропускаем {label}: {e}")
+            item.notice = f"\n⚠️ Пропущено: {label} ({e})"
+        except BadRequest as e:
+            if "too big" in str(e).lower():
+                logger.warning(f"Файл слишком большой для загрузки: {label}")
+                item.notice = f"\n⚠️ {label} слишком большой для загрузки"
+            else:
+                logger.error(f"Ошибка загрузки ({label}): {e}")
+                item.notice = f"\n❌ Ошибка загрузки: {label}"
+        except Exception as e:
+            logger.error(f"Неожиданная ошибка при загрузке ({label}): {e}")
+            item.notice = f"\n❌ Ошибка загрузки: {label}"
+
+        if item.notice and item.path and os.path.exists(item.path):
+            # Не оставляем в посте файл, обработка которого не завершилась
+            os.remove(item.path)
+            item.path = None
+
+        timings = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in item.timings.items())
+        logger.debug(f"Стадии обработки ({label}): {timings}")
+        return item
+
+    async def run_many(self, items):
+        """Обрабатывает несколько файлов параллельно"""
+        semaphore = asyncio.Semaphore(max(self.concurrency, 1))
+
+        async def _run(item):
+            async with semaphore:
+                return await self.run(item)
+
+        return await asyncio.gather(*(_run(item) for item in items))
+
+
+class MediaPostProcessor:
+    """Фоновая обработка сохраненных медиа в пуле процессов.
+
+    Перекодирование фото и разбор видео занимают CPU, поэтому выполняются
+    в отдельных процессах и никогда не блокируют event loop бота.
+    """
+
+    VIDEO_KINDS = ('video', 'animation', 'video_note')
+
+    def __init__(self, config: BotConfig):
+        self.config = config
+        self._executor = None
+        self.photo_available = importlib.util.find_spec('PIL') is not None
+        self.video_available = bool(shutil.which('ffprobe') and shutil.which('ffmpeg'))
+        if not self.photo_available:
+            logger.warning("Pillow не установлен - фото не будут перекодироваться")
+        if not self.video_available:
+            logger.warning("ffmpeg/ffprobe не найдены - видео не будут анализироваться")
+
+    def _get_executor(self):
+        if self._executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            import multiprocessing
+
+            # spawn вместо fork: процесс бота многопоточный (веб-сервер, запись файлов)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.config.postprocess_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self._executor
+
+    def task_for(self, item: MediaItem):
+        """Возвращает (функция, аргументы) обработки файла или None"""
+        config = self.config
+        if item.spec.kind == 'photo' and self.photo_available:
+            return recompress_photo, (item.path, config.photo_format, config.photo_quality)
+        if item.spec.kind in self.VIDEO_KINDS and self.video_available:
+            return probe_video, (item.path, config.preview_frames, config.preview_width)
+        return None
+
+    async def process(self, item: MediaItem) -> dict:
+        """Выполняет обработку файла в пуле процессов"""
+        task = self.task_for(item)
+        if task is None:
+            return {}
+        func, args = task
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class TokenBucket:
+    """Ограничитель частоты отправки: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, cost: int = 1):
+        """Ждет, пока в корзине не наберется cost токенов, и забирает их"""
+        if cost > self.capacity:
+            # Такая отправка никогда не дождалась бы токенов, а урезать стоимость нельзя
+            raise ValueError(f"Стоимость {cost} больше емкости корзины {self.capacity}")
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill()
+            if self.tokens >= cost:
+                self.tokens -= cost
+                return
+            await asyncio.sleep((cost - self.tokens) / self.rate)
+
+    def penalize(self, seconds: float):
+        """Останавливает отправку после RetryAfter и обнуляет запас токенов"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self.updated = self.blocked_until
+
+
+class PublishQueue:
+    """Очередь одобренных постов, сохраняемая в JSON-файл"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = self._load()
+
+    def _load(self) -> dict:
+        state = {'pending': [], 'published': {}, 'failed': {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    state.update(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.error(f"Не удалось прочитать очередь публикации {self.path}: {e}")
+        return state
+
+    def _save(self):
+        temp_file = self.path + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.path)
+
+    def _find(self, post_name: str):
+        for entry in self._state['pending']:
+            if entry['post'] == post_name:
+                return entry
+        return None
+
+    def add(self, post_name: str) -> bool:
+        """Ставит пост в очередь. False, если он уже в очереди или опубликован.
+
+        Снятый с очереди пост продолжает публикацию с первой неотправленной
+        части, чтобы уже вышедшие сообщения не дублировались.
+        """
+        with self._lock:
+            if self._find(post_name) or post_name in self._state['published']:
+                return False
+            failed = self._state['failed'].pop(post_name, None)
+            self._state['pending'].append({
+                'post': post_name,
+                'approved_at': datetime.now().isoformat(timespec='seconds'),
+                'attempts': 0,
+                'sent_ops': failed['sent_ops'] if failed else 0,
+                'message_ids': failed['message_ids'] if failed else [],
+            })
+            self._save()
+            return True
+
+    def peek(self):
+        """Первый пост в очереди или None"""
+        with self._lock:
+            pending = self._state['pending']
+            return dict(pending[0]) if pending else None
+
+    def update_progress(self, post_name: str, sent_ops: int, message_ids: list):
+        """Запоминает, сколько сообщений поста уже отправлено"""
+        with self._lock:
+            entry = self._find(post_name)
+            if entry:
+                entry['sent_ops'] = sent_ops
+                entry['message_ids'] = list(message_ids)
+                self._save()
+
+    def complete(self, post_name: str):
+        with self._lock:
+            entry = self._find(post_name)
+            if entry:
+                self._state['pending'].remove(entry)
+                self._state['published'][post_name] = {
+                    'published_at': datetime.now().isoformat(timespec='seconds'),
+                    'message_ids': entry['message_ids'],
+                }
+                self._save()
+
+    def fail(self, post_name: str, error: str, max_attempts: int) -> bool:
+        """Учитывает неудачную попытку. True, если пост снят с очереди"""
+        with self._lock:
+            entry = self._find(post_name)
+            if not entry:
+                return False
+            entry['attempts'] += 1
+            entry['last_error'] = error
+            self._state['pending'].remove(entry)
+            dropped = entry['attempts'] >= max_attempts
+            if dropped:
+                self._state['failed'][post_name] = entry
+            else:
+                # В конец очереди, чтобы проблемный пост не блокировал остальные
+                self._state['pending'].append(entry)
+            self._save()
+            return dropped
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                'pending': [entry['post'] for entry in self._state['pending']],
+                'published': len(self._state['published']),
+                'failed': list(self._state['failed']),
+            }
+
+    @property
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._state['pending'])
+
+
+class ChannelPublisher:
+    """Публикует посты из PublishQueue в канал с ограничением частоты.
+
+    Фото и видео уходят альбомами через sendMediaGroup (до 10 файлов), каждое
+    сообщение альбома списывает токен из TokenBucket. После RetryAfter
+    отправка приостанавливается на указанное время и повторяется то же
+    сообщение. Повтор после сетевой ошибки выполняется, только если запрос
+    точно не ушел в Telegram; при таймауте во время загрузки или ожидания
+    ответа результат неизвестен, и пост снимается с очереди до решения
+    администратора. Прогресс сохраняется в очереди, поэтому после
+    перезапуска пост не публикуется повторно с начала.
+    """
+
+    MEDIA_GROUP_LIMIT = 10
+    CAPTION_LIMIT = 1024
+    # Типы файлов для старых постов без meta.json
+    LEGACY_EXTENSIONS = {
+        '.jpg': 'photo', '.jpeg': 'photo', '.png': 'photo', '.webp': 'photo',
+        '.mp4': 'video', '.mov': 'video', '.gif': 'animation',
+        '.mp3': 'audio', '.m4a': 'audio', '.ogg': 'voice',
+    }
+    LEGACY_TEXT_PREFIXES = ("Текст сообщения: ", "Подпись: ")
+    LEGACY_META_PREFIXES = ("Подпись: ", "Переслано из канала: ", "Переслано от пользователя: ",
+                            "Автор поста: ", "ID пользователя: ", "Дата создания: ")
+
+    def __init__(self, queue: PublishQueue, posts_dir: str, config: BotConfig):
+        self.queue = queue
+        self.posts_dir = posts_dir
+        self.config = config
+        self.bucket = TokenBucket(config.publish_rate_per_minute / 60, config.publish_burst)
+
+    async def run(self, bot):
+        """Основной цикл публикации"""
+        logger.info(f"Публикация в канал {self.config.channel_id} запущена")
+        while True:
+            entry = self.queue.peek()
+            if entry is None:
+                await asyncio.sleep(self.config.publish_poll_interval)
+                continue
+            try:
+                await self._publish(bot, entry)
+            except Exception as e:
+                # Один проблемный пост не должен останавливать публикацию остальных
+                dropped = self.queue.fail(entry['post'], repr(e), self.config.publish_max_attempts)
+                logger.error(f"Непредвиденная ошибка публикации {entry['post']}: {e!r}"
+                             + (" - пост снят с очереди" if dropped else ""))
+                await asyncio.sleep(self.config.publish_poll_interval)
+
+    def _load_post(self, post_dir: str):
+        """Возвращает (текст в HTML, список (тип, путь)) для поста"""
+        meta_file = os.path.join(post_dir, "meta.json")
+        if os.path.exists(meta_file):
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            media = [(record['type'], os.path.join(post_dir, record['file']))
+                     for record in metadata.get('media', [])]
+            return metadata.get('text_html', ''), media
+
+        # Пост сохранен до появления meta.json: восстанавливаем по content.txt и файлам
+        text = self._legacy_text(os.path.join(post_dir, "content.txt"))
+        media = []
+        for file_name in sorted(os.listdir(post_dir)):
+            if file_name == "content.txt":
+                continue
+            ext = os.path.splitext(file_name)[1].lower()
+            media.append((self.LEGACY_EXTENSIONS.get(ext, 'document'), os.path.join(post_dir, file_name)))
+        return text, media
+
+    def _legacy_text(self, content_file: str) -> str:
+        """Извлекает текст поста из content.txt"""
+        import html
+
+        if not os.path.exists(content_file):
+            return ''
+        with open(content_file, 'r', encoding='utf-8') as f:
+            lines = f.read().split("\n")
+        text_lines = []
+        collecting = False
+        for line in lines:
+            prefix = next((p for p in self.LEGACY_TEXT_PREFIXES if line.startswith(p)), None)
+            if prefix and not text_lines:
+                collecting = True
+                line = line[len(prefix):]
+            elif line.startswith(self.LEGACY_META_PREFIXES):
+                collecting = False
+            if collecting:
+                text_lines.append(line)
+        return html.escape("\n".join(text_lines).strip())
+
+    def _build_operations(self, post_dir: str, text: str, media: list):
+        """Разбивает пост на отправки: (стоимость в сообщениях, корутина send(bot, chat_id)).
+
+        Отправка хранит номера файлов в списке медиа поста, а пути определяет
+        в момент отправки: постобработка может заменить файл, пока пост ждет
+        своей очереди.
+        """
+        groups = {'visual': [], 'document': [], 'audio': []}
+        singles = []
+        for position, (kind, _) in enumerate(media):
+            if kind in ('photo', 'video'):
+                groups['visual'].append((kind, position))
+            elif kind in ('document', 'audio'):
+                groups[kind].append((kind, position))
+            else:
+                singles.append((kind, position))
+
+        operations = []
+        for items in groups.values():
+            for start in range(0, len(items), self.MEDIA_GROUP_LIMIT):
+                operations.append(items[start:start + self.MEDIA_GROUP_LIMIT])
+        operations.extend([item] for item in singles)
+
+        # Подпись добавляем к первой отправке, которая ее поддерживает
+        caption = None
+        captioned = next((index for index, items in enumerate(operations)
+                          if items[0][0] not in ('sticker', 'video_note')), None)
+        if text and captioned is not None and len(text) <= self.CAPTION_LIMIT:
+            caption = text
+        result = []
+        if text and caption is None:
+            result.append((1, self._send_text(text)))
+        for index, items in enumerate(operations):
+            result.append((len(items), self._send_items(post_dir, items, caption if index == captioned else None)))
+        return result
+
+    def _send_text(self, text: str):
+        async def send(bot, chat_id):
+            return [await bot.send_message(chat_id, text, parse_mode=ParseMode.HTML)]
+        return send
+
+    def _send_items(self, post_dir: str, items: list, caption):
+        input_media = {'photo': InputMediaPhoto, 'video': InputMediaVideo,
+                       'document': InputMediaDocument, 'audio': InputMediaAudio}
+        single_senders = {'photo': 'send_photo', 'video': 'send_video', 'document': 'send_document',
+                          'audio': 'send_audio', 'animation': 'send_animation', 'voice': 'send_voice',
+                          'video_note': 'send_video_note', 'sticker': 'send_sticker'}
+
+        async def send(bot, chat_id):
+            caption_kwargs = {'caption': caption, 'parse_mode': ParseMode.HTML} if caption else {}
+            _, media = self._load_post(post_dir)
+            files = [(kind, media[position][1]) for kind, position in items]
+            # Без явного write_timeout PTB ограничивает загрузку файлов 20 секундами
+            total_size = sum(os.path.getsize(path) for _, path in files)
+            timeouts = {'write_timeout': self.config.upload_timeout(total_size),
+                        'read_timeout': self.config.publish_read_timeout}
+            # Передаем открытые файлы, а не Path: в локальном режиме Bot API PTB превращает
+            # Path в file:// URI, а у контейнера сервера нет доступа к папке постов
+            with contextlib.ExitStack() as stack:
+                handles = [stack.enter_context(open(path, 'rb')) for _, path in files]
+                if len(files) == 1:
+                    kind = files[0][0]
+                    method = getattr(bot, single_senders.get(kind, 'send_document'))
+                    return [await method(chat_id, handles[0], **caption_kwargs, **timeouts)]
+                group = [input_media[kind](handle, **(caption_kwargs if index == 0 else {}))
+                         for index, ((kind, _), handle) in enumerate(zip(files, handles))]
+                return list(await bot.send_media_group(chat_id, group, **timeouts))
+        return send
+
+    @staticmethod
+    def _request_not_sent(error: NetworkError) -> bool:
+        """True, если запрос точно не дошел до Telegram и его можно повторить"""
+        # HTTPXRequest сохраняет исходное исключение httpx в __cause__
+        return isinstance(error.__cause__, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+    async def _notify_admins(self, bot, text: str):
+        for admin_id in self.config.publish_admin_ids:
+            try:
+                await bot.send_message(admin_id, text)
+            except TelegramError as e:
+                logger.warning(f"Не удалось уведомить администратора {admin_id}: {e}")
+
+    async def _publish(self, bot, entry: dict):
+        post_name = entry['post']
+        post_dir = os.path.join(self.posts_dir, post_name)
+        chat_id = self.config.channel_id
+        message_ids = list(entry['message_ids'])
+        try:
+            operations = self._build_operations(post_dir, *self._load_post(post_dir))
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Не удалось подготовить {post_name} к публикации: {e}")
+            self.queue.fail(post_name, str(e), max_attempts=1)
+            return
+
+        for index in range(entry['sent_ops'], len(operations)):
+            cost, send = operations[index]
+            while True:
+                await self.bucket.acquire(cost)
+                try:
+                    messages = await send(bot, chat_id)
+                    break
+                except RetryAfter as e:
+                    logger.warning(f"Лимит Telegram при публикации {post_name}, пауза {e.retry_after} сек")
+                    self.bucket.penalize(e.retry_after)
+                except NetworkError as e:
+                    if self._request_not_sent(e):
+                        logger.warning(f"Сетевая ошибка при публикации {post_name}: {e}. Повтор...")
+                        self.bucket.penalize(self.config.publish_poll_interval)
+                        continue
+                    # Telegram мог уже принять сообщение: повтор вслепую дал бы дубль в канале
+                    error = (f"Неизвестно, опубликована ли часть {index + 1} из {len(operations)}: "
+                             f"{e.__class__.__name__}: {e}")
+                    self.queue.fail(post_name, error, max_attempts=1)
+                    logger.error(f"{post_name}: {error} - пост снят с очереди, проверьте канал")
+                    await self._notify_admins(
+                        bot, f"⚠️ {post_name}: {error}. Проверьте канал: если этой части там нет, "
+                             f"повторите /approve - публикация продолжится с нее.")
+                    return
+                except (TelegramError, OSError) as e:
+                    # OSError - файл поста пропал или недоступен
+                    dropped = self.queue.fail(post_name, str(e), self.config.publish_max_attempts)
+                    logger.error(f"Ошибка публикации {post_name}: {e}"
+                                 + (" - пост снят с очереди" if dropped else ""))
+                    return
+            message_ids.extend(message.message_id for message in messages)
+            self.queue.update_progress(post_name, index + 1, message_ids)
+
+        self.queue.complete(post_name)
+        logger.info(f"Опубликован {post_name} ({len(message_ids)} сообщений)")
+
+
+class PostNotReady(Exception):
+    """Пост еще сохраняется и не может быть опубликован"""
+
+
 class PostBot:
-    def __init__(self, token: str):
+    def __init__(self, token: str, config: BotConfig = None):
         self.token = token
+        self.config = config or BotConfig()
         self.posts_dir = "posts"
+        self._download_client = None
+        self._metadata_lock = threading.Lock()
+        tracer.configure(self.config.tracing_enabled, self.config.trace_buffer_size,
+                         self.config.slow_handler_ms)
+        self.media_pipeline = MediaPipeline([
+            ('admission', self._stage_admission),
+            ('fetch', self._stage_fetch),
+            ('hash', self._stage_hash),
+            ('store', self._stage_store),
+        ], concurrency=self.config.download_pool_size)
+        self.postprocessor = None
+        self._background_tasks = set()
+        if self.config.postprocess_enabled:
+            self.postprocessor = MediaPostProcessor(self.config)
+            self.media_pipeline.add_stage('postprocess', self._stage_postprocess)
+        # Состояние для проб готовности
+        self.phase = 'starting'
+        self.application = None
+        self._get_updates_request = None
+        self.heartbeat = None
+        self._heartbeat_task = None
         self._ensure_posts_directory()
+        self.publish_queue = PublishQueue(os.path.join(self.posts_dir, "publish_queue.json"))
+        self.publisher = None
+        self._publisher_task = None
+        if self.config.channel_id:
+            self.publisher = ChannelPublisher(self.publish_queue, self.posts_dir, self.config)
 
     def _ensure_posts_directory(self):
         """Создает директорию для постов, если она не существует"""
@@ -86,24 +1189,256 @@ class PostBot:
             f.write(text)
         logger.info(f"Saved text content to: {text_file}")
 
-    def _save_media_file(self, post_dir: str, file_path: str, file_name: str):
-        """Сохраняет медиа файл в папку поста"""
+    def _write_post_metadata(self, post_dir: str, metadata: dict):
+        """Атомарно записывает метаданные поста в meta.json"""
+        meta_file = os.path.join(post_dir, "meta.json")
+        temp_file = meta_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, meta_file)
+
+    def _load_post_metadata(self, post_dir: str) -> dict:
+        """Читает метаданные поста"""
+        meta_file = os.path.join(post_dir, "meta.json")
+        if not os.path.exists(meta_file):
+            return {}
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _update_post_metadata(self, post_dir: str, update):
+        """Изменяет метаданные поста функцией update(metadata)"""
+        with self._metadata_lock:
+            metadata = self._load_post_metadata(post_dir)
+            update(metadata)
+            self._write_post_metadata(post_dir, metadata)
+
+    def _unique_file_path(self, post_dir: str, file_name: str) -> str:
+        """Возвращает путь в папке поста, не занятый другим файлом"""
         # Создаем уникальное имя файла, если файл с таким именем уже существует
         base_name, ext = os.path.splitext(file_name)
         counter = 1
-        final_file_name = file_name
-        final_file_path = os.path.join(post_dir, final_file_name)
+        final_file_path = os.path.join(post_dir, file_name)
 
         while os.path.exists(final_file_path):
-            final_file_name = f"{base_name}_{counter}{ext}"
-            final_file_path = os.path.join(post_dir, final_file_name)
+            final_file_path = os.path.join(post_dir, f"{base_name}_{counter}{ext}")
             counter += 1
+        return final_file_path
+
+    def _get_download_client(self) -> httpx.AsyncClient:
+        """Возвращает HTTP-клиент с отдельным пулом соединений для скачивания файлов"""
+        if self._download_client is None:
+            config = self.config
+            self._download_client = httpx.AsyncClient(
+                http2=config.http2,
+                limits=httpx.Limits(
+                    max_connections=config.download_pool_size,
+                    max_keepalive_connections=config.download_keepalive,
+                    keepalive_expiry=config.download_keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(
+                    connect=config.download_connect_timeout,
+                    read=config.download_read_timeout,
+                    write=config.download_read_timeout,
+                    pool=config.download_base_timeout,
+                ),
+            )
+        return self._download_client
+
+    async def _download_file(self, file_url: str, destination: str, file_size: int) -> str:
+        """Скачивает файл через пул загрузок с докачкой, возвращает SHA-256"""
+        download = ResumableDownload(self._get_download_client(), file_url, destination,
+                                     file_size, self.config)
+        return await download.run()
+
+    def _resolve_local_path(self, tg_file):
+        """Возвращает путь к файлу в хранилище локального сервера Bot API или None"""
+        if not self.config.local_mode:
+            return None
+        file_path = tg_file.file_path
+        base_file_url = tg_file.get_bot().base_file_url
+        # PTB дописывает base_file_url, если не нашел путь на диске
+        if file_path.startswith(base_file_url):
+            file_path = '/' + file_path[len(base_file_url):].lstrip('/')
+        if self.config.local_path_map:
+            server_prefix, local_prefix = self.config.local_path_map
+            if file_path.startswith(server_prefix):
+                file_path = local_prefix + file_path[len(server_prefix):]
+        return file_path if os.path.isfile(file_path) else None
+
+    def _ingest_local_file(self, source: str, destination: str):
+        """Забирает файл из хранилища сервера Bot API без скачивания по HTTP"""
+        mode = self.config.local_ingest
+        if mode == 'link':
+            try:
+                os.link(source, destination)
+                return
+            except OSError as e:
+                # Другое монтирование/файловая система или нет прав - копируем
+                logger.info(f"Не удалось создать жесткую ссылку ({e}), копируем файл целиком")
+        elif mode == 'move':
+            shutil.move(source, destination)
+            return
+        shutil.copy2(source, destination)
+
+    async def _stage_admission(self, item: MediaItem):
+        """Проверяет, можно ли скачать файл"""
+        if item.size_mb > self.config.max_file_size_mb:
+            raise MediaSkipped(f"{item.size_mb:.1f}MB")
+
+    async def _stage_fetch(self, item: MediaItem):
+        """Сохраняет файл прямо в папку поста"""
+        with tracer.span("get_file"):
+            tg_file = await item.media.get_file()
+        item.path = self._unique_file_path(item.post_dir, item.file_name)
+
+        local_path = self._resolve_local_path(tg_file)
+        if local_path:
+            with tracer.span("local_ingest"):
+                await asyncio.to_thread(self._ingest_local_file, local_path, item.path)
+        else:
+            with tracer.span("download"):
+                item.sha256 = await self._download_file(tg_file.file_path, item.path, item.file_size)
+        item.file_size = os.path.getsize(item.path)
+        logger.info(f"Saved media file to: {item.path}")
+
+    async def _stage_hash(self, item: MediaItem):
+        """Считает SHA-256, если он не посчитан при скачивании"""
+        if item.sha256 is None:
+            item.sha256 = await asyncio.to_thread(file_sha256, item.path)
+
+    async def _stage_store(self, item: MediaItem):
+        """Добавляет запись о файле в метаданные поста"""
+        item.metadata.update({
+            'type': item.spec.kind,
+            'file': os.path.basename(item.path),
+            'size': item.file_size,
+            'sha256': item.sha256,
+            'file_unique_id': item.media.file_unique_id,
+        })
+        await asyncio.to_thread(self._update_post_metadata, item.post_dir,
+                                lambda metadata: metadata.setdefault('media', []).append(item.metadata))
+
+    async def _stage_postprocess(self, item: MediaItem):
+        """Запускает фоновую обработку файла, не задерживая ответ пользователю"""
+        if self.postprocessor.task_for(item) is None:
+            return
+        task = asyncio.create_task(self._postprocess_media(item))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _postprocess_media(self, item: MediaItem):
+        """Обрабатывает файл в пуле процессов и сохраняет результат в метаданные поста"""
+        file_name = os.path.basename(item.path)
+        started = time.perf_counter()
+        try:
+            result = await self.postprocessor.process(item)
+        except Exception as e:
+            logger.error(f"Ошибка постобработки {file_name}: {e}")
+            result = {'error': str(e)}
+        else:
+            logger.info(f"Постобработка {file_name} за {time.perf_counter() - started:.1f} сек")
+
+        replacement = result.pop('file', None)
+        replaced = False
+
+        def _update(metadata):
+            nonlocal replaced
+            for record in metadata.get('media', []):
+                if record.get('file') == file_name:
+                    if replacement:
+                        # Фото перекодировано - запись указывает на новый файл
+                        record['file'] = replacement
+                        record.update({key: result.pop(key) for key in ('size', 'sha256') if key in result})
+                        replaced = True
+                    record['postprocess'] = result
+
+        await asyncio.to_thread(self._update_post_metadata, item.post_dir, _update)
+        if replacement:
+            # Удаляем только после записи meta.json, чтобы он не ссылался на отсутствующий файл
+            obsolete = item.path if replaced else os.path.join(item.post_dir, replacement)
+            with contextlib.suppress(OSError):
+                os.remove(obsolete)
+            if replaced:
+                item.path = os.path.join(item.post_dir, replacement)
+
+    async def _heartbeat(self):
+        """Отмечает, что event loop не заблокирован"""
+        while True:
+            self.heartbeat = time.monotonic()
+            await asyncio.sleep(5)
+
+    def _storage_writable(self) -> bool:
+        """Проверяет, что в папку постов можно записать файл"""
+        import tempfile
 
-        # Копируем файл
-        import shutil
-        shutil.copy2(file_path, final_file_path)
-        logger.info(f"Saved media file to: {final_file_path}")
-        return final_file_name
+        try:
+            with tempfile.NamedTemporaryFile(dir=self.posts_dir, prefix='.probe_'):
+                return True
+        except OSError:
+            return False
+
+    def health(self):
+        """Живость процесса: event loop бота не завис"""
+        details = {'phase': self.phase}
+        if self.heartbeat is not None:
+            stalled = time.monotonic() - self.heartbeat
+            details['loop_stalled_seconds'] = round(stalled, 1)
+            if stalled > self.config.health_loop_stall:
+                return False, details
+        return True, details
+
+    def readiness(self):
+        """Готовность: polling подключен, хранилище доступно, очередь не переполнена и разбирается"""
+        application = self.application
+        request = self._get_updates_request
+        poll_age = None
+        if request is not None and request.last_success is not None:
+            poll_age = time.monotonic() - request.last_success
+        polling = (self.phase == 'polling' and application is not None and application.running
+                   and application.updater.running
+                   and poll_age is not None and poll_age <= self.config.ready_poll_staleness)
+
+        storage = self._storage_writable()
+        queue_depth = self.publish_queue.depth
+        max_depth = self.config.ready_max_queue_depth
+        queue = not max_depth or queue_depth <= max_depth
+        # Завершившаяся задача публикации означает, что очередь больше не разбирается
+        publisher = self._publisher_task is None or not self._publisher_task.done()
+
+        details = {
+            'phase': self.phase,
+            'polling': polling,
+            'last_get_updates_seconds_ago': round(poll_age, 1) if poll_age is not None else None,
+            'last_get_updates_error': request.last_error if request is not None else None,
+            'storage_writable': storage,
+            'queue_depth': queue_depth,
+            'publisher_running': publisher,
+            'background_tasks': len(self._background_tasks),
+        }
+        return polling and storage and queue and publisher, details
+
+    async def _on_startup(self, application):
+        """Запускает фоновые задачи после инициализации приложения"""
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        if self.publisher:
+            self._publisher_task = asyncio.create_task(self.publisher.run(application.bot))
+
+    async def _on_shutdown(self, application=None):
+        """Освобождает ресурсы при остановке приложения"""
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+            self.heartbeat = None
+        if self._publisher_task:
+            self._publisher_task.cancel()
+            self._publisher_task = None
+        if self._background_tasks:
+            await asyncio.wait(self._background_tasks, timeout=30)
+        if self.postprocessor:
+            self.postprocessor.shutdown()
+        if self._download_client is not None:
+            await self._download_client.aclose()
+            self._download_client = None
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
@@ -149,17 +1484,65 @@ class PostBot:
         # Устанавливаем состояние ожидания поста
         context.user_data['waiting_for_post'] = True
 
+    def approve_post(self, post_name: str) -> bool:
+        """Ставит существующий пост в очередь публикации"""
+        post_dir = os.path.join(self.posts_dir, post_name)
+        if not post_name.startswith("Пост_") or os.sep in post_name or not os.path.isdir(post_dir):
+            raise FileNotFoundError(post_name)
+        # Посты, сохраненные до появления флага, считаются завершенными
+        if self._load_post_metadata(post_dir).get('complete') is False:
+            raise PostNotReady(post_name)
+        return self.publish_queue.add(post_name)
+
+    async def approve_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /approve <номер поста>"""
+        if update.effective_user.id not in self.config.publish_admin_ids:
+            await update.message.reply_text("⛔ Одобрять посты могут только администраторы (PUBLISH_ADMIN_IDS)")
+            return
+        if not context.args:
+            await update.message.reply_text("Использование: /approve <номер поста>")
+            return
+
+        post_name = context.args[0] if context.args[0].startswith("Пост_") else f"Пост_{context.args[0]}"
+        try:
+            added = self.approve_post(post_name)
+        except FileNotFoundError:
+            await update.message.reply_text(f"❌ {post_name} не найден")
+            return
+        except PostNotReady:
+            await update.message.reply_text(f"⏳ {post_name} еще сохраняется, повторите позже")
+            return
+        if added:
+            await update.message.reply_text(
+                f"📤 {post_name} добавлен в очередь публикации (в очереди: {self.publish_queue.depth})")
+        else:
+            await update.message.reply_text(f"ℹ️ {post_name} уже в очереди или опубликован")
+
+    async def queue_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /queue"""
+        status = self.publish_queue.status()
+        text = (f"📤 В очереди: {len(status['pending'])}\n"
+                f"✅ Опубликовано: {status['published']}\n"
+                f"❌ С ошибками: {len(status['failed'])}")
+        if not self.publisher:
+            text += "\n\n⚠️ CHANNEL_ID не задан - публикация выключена"
+        await update.message.reply_text(text)
+
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик всех сообщений"""
         if not context.user_data.get('waiting_for_post'):
             return
+        # Сбрасываем состояние ожидания сразу: обновления обрабатываются параллельно,
+        # и остальные сообщения альбома не должны создать отдельные посты
+        context.user_data['waiting_for_post'] = False
 
         user = update.effective_user
         message = update.message
 
         # Получаем следующий номер поста
-        post_number = self._get_next_post_number()
-        post_dir = self._create_post_directory(post_number)
+        with tracer.span("scan_posts"):
+            post_number = self._get_next_post_number()
+            post_dir = self._create_post_directory(post_number)
 
         # Сохраняем текстовый контент
         text_content = []
@@ -180,166 +1563,43 @@ class PostBot:
         text_content.append(f"ID пользователя: {user.id}")
         text_content.append(f"Дата создания: {message.date}")
 
-        # Сохраняем текст
-        if text_content:
-            full_text = "\n".join(text_content)
-            self._save_text_content(post_dir, full_text)
+        with tracer.span("save_text"):
+            # Сохраняем текст
+            if text_content:
+                full_text = "\n".join(text_content)
+                self._save_text_content(post_dir, full_text)
+
+            # Метаданные поста: текст с разметкой и сохраненные файлы
+            self._write_post_metadata(post_dir, {
+                'text_html': message.text_html or message.caption_html or '',
+                'author_id': user.id,
+                'created': message.date.isoformat(),
+                'media': [],
+                # Пока файлы скачиваются, пост нельзя одобрить - ушел бы без медиа
+                'complete': False,
+            })
 
         # Обрабатываем медиа файлы
         saved_files = []
         response_text = f"✅ Пост успешно сохранен!\n\n📁 Папка: Пост_{post_number}\n📂 Директория: {post_dir}\n"
 
-        # Фото
-        if message.photo:
-            photo = message.photo[-1]  # Берем фото в максимальном качестве
-            file_size_mb = photo.file_size / (1024 * 1024)
-
-            if file_size_mb > 50:
-                logger.warning(f"Фото слишком большое: {file_size_mb:.1f}MB. Пропускаем.")
-                response_text += f"\n⚠️ Пропущено фото ({file_size_mb:.1f}MB)"
-            else:
-                try:
-                    file_path = await photo.get_file()
-                    await file_path.download_to_drive(f"temp_photo_{user.id}.jpg")
-                    saved_name = self._save_media_file(post_dir, f"temp_photo_{user.id}.jpg", "photo.jpg")
-                    saved_files.append(saved_name)
-                    logger.info(f"Успешно загружено фото ({file_size_mb:.1f}MB)")
-                except Exception as e:
-                    logger.error(f"Ошибка загрузки фото: {e}")
-                    response_text += "\n❌ Ошибка загрузки фото"
-                finally:
-                    if os.path.exists(f"temp_photo_{user.id}.jpg"):
-                        os.remove(f"temp_photo_{user.id}.jpg")
-
-        # Видео
-        if message.video:
-            video = message.video
-            file_size_mb = video.file_size / (1024 * 1024)
-
-            if file_size_mb > 50:
-                logger.warning(f"Видео слишком большое: {file_size_mb:.1f}MB. Пропускаем.")
-                response_text += f"\n⚠️ Пропущено видео ({file_size_mb:.1f}MB)"
-            else:
-                try:
-                    file_path = await video.get_file()
-                    await file_path.download_to_drive(f"temp_video_{user.id}.mp4")
-                    saved_name = self._save_media_file(post_dir, f"temp_video_{user.id}.mp4", "video.mp4")
-                    saved_files.append(saved_name)
-                    logger.info(f"Успешно загружено видео ({file_size_mb:.1f}MB)")
-                except Exception as e:
-                    logger.error(f"Ошибка загрузки видео: {e}")
-                    response_text += "\n❌ Ошибка загрузки видео"
-                finally:
-                    if os.path.exists(f"temp_video_{user.id}.mp4"):
-                        os.remove(f"temp_video_{user.id}.mp4")
-
-        # Документы
-        if message.document:
-            document = message.document
-            file_size_mb = document.file_size / (1024 * 1024)  # Размер в МБ
-            temp_filename = None
-
-            try:
-                # Проверяем размер файла (Telegram Bot API лимит ~50MB для getFile)
-                if file_size_mb > 50:
-                    logger.warning(f"Файл слишком большой: {file_size_mb:.1f}MB. Пропускаем.")
-                    response_text += f"\n⚠️ Файл '{document.file_name}' слишком большой для загрузки"
-                else:
-                    file_path = await document.get_file()
-                    file_extension = os.path.splitext(document.file_name)[1] or ".bin"
-                    temp_filename = f"temp_doc_{user.id}{file_extension}"
-
-                    # Загружаем файл с увеличенным таймаутом
-                    await file_path.download_to_drive(temp_filename)
-                    saved_name = self._save_media_file(post_dir, temp_filename, document.file_name)
-                    saved_files.append(saved_name)
-                    logger.info(f"Успешно загружен файл: {document.file_name} ({file_size_mb:.1f}MB)")
-
-            except BadRequest as e:
-                if "too big" in str(e).lower():
-                    logger.warning(f"Файл слишком большой для загрузки: {document.file_name}")
-                    response_text += f"\n⚠️ Файл '{document.file_name}' слишком большой для загрузки"
-                else:
-                    logger.error(f"Ошибка загрузки файла {document.file_name}: {e}")
-                    response_text += f"\n❌ Ошибка загрузки файла '{document.file_name}'"
-            except Exception as e:
-                logger.error(f"Неожиданная ошибка при загрузке файла {document.file_name}: {e}")
-                response_text += f"\n❌ Ошибка загрузки файла '{document.file_name}'"
-            finally:
-                # Удаляем временный файл
-                if temp_filename and os.path.exists(temp_filename):
-                    os.remove(temp_filename)
-
-        # Анимации (GIF)
-        if message.animation:
-            animation = message.animation
-            file_size_mb = animation.file_size / (1024 * 1024)
-
-            if file_size_mb > 50:
-                logger.warning(f"GIF слишком большой: {file_size_mb:.1f}MB. Пропускаем.")
-                response_text += f"\n⚠️ Пропущена GIF ({file_size_mb:.1f}MB)"
-            else:
-                try:
-                    file_path = await animation.get_file()
-                    await file_path.download_to_drive(f"temp_animation_{user.id}.gif")
-                    saved_name = self._save_media_file(post_dir, f"temp_animation_{user.id}.gif", "animation.gif")
-                    saved_files.append(saved_name)
-                    logger.info(f"Успешно загружена GIF ({file_size_mb:.1f}MB)")
-                except Exception as e:
-                    logger.error(f"Ошибка загрузки GIF: {e}")
-                    response_text += "\n❌ Ошибка загрузки GIF"
-                finally:
-                    if os.path.exists(f"temp_animation_{user.id}.gif"):
-                        os.remove(f"temp_animation_{user.id}.gif")
-
-        # Аудио
-        if message.audio:
-            audio = message.audio
-            file_size_mb = audio.file_size / (1024 * 1024)
-
-            if file_size_mb > 50:
-                logger.warning(f"Аудио слишком большое: {file_size_mb:.1f}MB. Пропускаем.")
-                response_text += f"\n⚠️ Пропущено аудио ({file_size_mb:.1f}MB)"
-            else:
-                try:
-                    file_path = await audio.get_file()
-                    file_extension = os.path.splitext(audio.file_name)[1] if hasattr(audio, 'file_name') else ".mp3"
-                    temp_filename = f"temp_audio_{user.id}{file_extension}"
-                    await file_path.download_to_drive(temp_filename)
-                    saved_name = self._save_media_file(post_dir, temp_filename, audio.file_name or "audio.mp3")
-                    saved_files.append(saved_name)
-                    logger.info(f"Успешно загружено аудио ({file_size_mb:.1f}MB)")
-                except Exception as e:
-                    logger.error(f"Ошибка загрузки аудио: {e}")
-                    response_text += "\n❌ Ошибка загрузки аудио"
-                finally:
-                    if os.path.exists(temp_filename):
-                        os.remove(temp_filename)
-
-        # Голосовые сообщения
-        if message.voice:
-            voice = message.voice
-            file_size_mb = voice.file_size / (1024 * 1024)
-
-            if file_size_mb > 50:
-                logger.warning(f"Голосовое сообщение слишком большое: {file_size_mb:.1f}MB. Пропускаем.")
-                response_text += f"\n⚠️ Пропущено голосовое ({file_size_mb:.1f}MB)"
-            else:
-                try:
-                    file_path = await voice.get_file()
-                    await file_path.download_to_drive(f"temp_voice_{user.id}.ogg")
-                    saved_name = self._save_media_file(post_dir, f"temp_voice_{user.id}.ogg", "voice.ogg")
-                    saved_files.append(saved_name)
-                    logger.info(f"Успешно загружено голосовое ({file_size_mb:.1f}MB)")
-                except Exception as e:
-                    logger.error(f"Ошибка загрузки голосового: {e}")
-                    response_text += "\n❌ Ошибка загрузки голосового"
-                finally:
-                    if os.path.exists(f"temp_voice_{user.id}.ogg"):
-                        os.remove(f"temp_voice_{user.id}.ogg")
+        items = []
+        for spec in MEDIA_TYPES:
+            media = spec.extract(message)
+            if media is None:
+                continue
+            # У GIF Telegram заполняет и animation, и document - сохраняем один раз
+            if spec.kind == 'document' and message.animation:
+                continue
+            items.append(MediaItem(spec, media, post_dir))
 
-        # Сбрасываем состояние ожидания
-        context.user_data['waiting_for_post'] = False
+        for item in await self.media_pipeline.run_many(items):
+            if item.saved_name:
+                saved_files.append(item.saved_name)
+            elif item.notice:
+                response_text += item.notice
+        await asyncio.to_thread(self._update_post_metadata, post_dir,
+                                lambda metadata: metadata.update(complete=True))
 
         # Добавляем информацию о контенте в ответ
         if text_content:
@@ -347,227 +1607,487 @@ class PostBot:
         if saved_files:
             response_text += f"\n📎 Сохранено файлов: {len(saved_files)}"
 
-        await update.message.reply_text(response_text)
+        with tracer.span("reply"):
+            await update.message.reply_text(response_text)
 
     def create_application(self):
         """Создание приложения бота"""
-        # Создаем приложение с увеличенными таймаутами для больших файлов
-        application = (Application.builder()
-                      .token(self.token)
-                      .get_updates_read_timeout(30)  # Увеличиваем таймаут для получения обновлений
-                      .get_updates_write_timeout(30)  # Таймаут для отправки
+        config = self.config
+        # Отдельные пулы соединений: вызовы API и long-polling не мешают друг другу,
+        # а файлы скачиваются через собственный клиент (см. _get_download_client)
+        api_request = HTTPXRequest(
+            connection_pool_size=config.api_pool_size,
+            connect_timeout=config.api_connect_timeout,
+            read_timeout=config.api_read_timeout,
+            write_timeout=config.api_write_timeout,
+            pool_timeout=config.api_pool_timeout,
+            http_version=config.http_version,
+        )
+        get_updates_request = TrackedHTTPXRequest(
+            name="getUpdates",
+            connection_pool_size=config.get_updates_pool_size,
+            connect_timeout=config.api_connect_timeout,
+            read_timeout=config.get_updates_read_timeout,  # Увеличиваем таймаут для получения обновлений
+            write_timeout=config.get_updates_write_timeout,  # Таймаут для отправки
+            pool_timeout=config.api_pool_timeout,
+            http_version=config.http_version,
+        )
+        builder = Application.builder().token(self.token)
+        if config.api_url:
+            # Собственный сервер Bot API: файлы до 2GB и пути к ним на диске
+            builder = (builder
+                       .base_url(f"{config.api_url}/bot")
+                       .base_file_url(f"{config.api_url}/file/bot")
+                       .local_mode(config.local_mode))
+        application = (builder
+                      .request(api_request)
+                      .get_updates_request(get_updates_request)
+                      .concurrent_updates(config.concurrent_updates)
+                      .post_init(self._on_startup)
+                      .post_shutdown(self._on_shutdown)
                       .build())
+        self.application = application
+        self._get_updates_request = get_updates_request
 
         # Регистрируем обработчики
         application.add_handler(CommandHandler("start", self.start_command))
         application.add_handler(CommandHandler("post", self.post_command))
+        application.add_handler(CommandHandler("approve", self.approve_command))
+        application.add_handler(CommandHandler("queue", self.queue_command))
         application.add_handler(CallbackQueryHandler(self.button_handler))
         application.add_handler(MessageHandler(
             filters.TEXT | filters.PHOTO | filters.VIDEO | filters.Document.ALL |
-            filters.ANIMATION | filters.AUDIO | filters.VOICE,
+            filters.ANIMATION | filters.AUDIO | filters.VOICE | filters.VIDEO_NOTE |
+            filters.Sticker.ALL,
             self.handle_message
         ))
 
+        # Замеры времени для всех обработчиков (запись включается TRACING_ENABLED или через /api/tracing)
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                tracer.wrap_handler(handler)
+
         return application
 
     async def run_with_retry(self, max_retries=5):
         """Запуск бота с автоматическим перезапуском при конфликтах"""
         application = self.create_application()
+        startup_profile.mark("application built")
 
         for attempt in range(max_retries):
             try:
                 logger.info(f"Попытка запуска бота №{attempt + 1}/{max_retries}")
                 logger.info("Bot started successfully!")
+                self.phase = 'polling'
                 await application.run_polling()
                 break  # Если успешно запустился, выходим из цикла
 
             except Conflict as e:
                 if attempt < max_retries - 1:
                     wait_time = 30 * (attempt + 1)  # Увеличиваем время ожидания
+                    # В PTB 20.8 run_polling не пробрасывает Conflict из getUpdates: updater
+                    # сам повторяет запрос. Тогда /readyz уходит в 503 по READY_POLL_STALENESS,
+                    # а сюда попадаем, только если Conflict возник вне цикла getUpdates
+                    self.phase = 'conflict_backoff'
                     logger.warning(f"Конфликт бота (попытка {attempt + 1}). Ожидаем {wait_time} секунд...")
                     await asyncio.sleep(wait_time)
                 else:
                     logger.error("Превышено максимальное количество попыток перезапуска")
+                    self.phase = 'failed'
                     raise e
 
             except (RetryAfter, TimedOut) as e:
                 wait_time = getattr(e, 'retry_after', 60)
+                self.phase = 'retry_wait'
                 logger.warning(f"Временная ошибка, ждем {wait_time} секунд...")
                 await asyncio.sleep(wait_time)
 
             except BadRequest as e:
                 logger.error(f"Ошибка конфигурации бота: {e}")
+                self.phase = 'failed'
                 break
 
             except Exception as e:
                 logger.error(f"Неожиданная ошибка: {e}")
+                self.phase = 'retry_wait'
                 if attempt < max_retries - 1:
                     logger.info("Повторная попытка через 30 секунд...")
                     await asyncio.sleep(30)
                 else:
+                    self.phase = 'failed'
                     raise e
 
+        if self.phase == 'polling':
+            self.phase = 'stopped'
+
+
+# Панель управления. Шаблон компилируется и рендерится один раз при запуске
+# (см. WebInterface._build_assets), CSS и JS отдаются как статика с хешем в имени.
+DASHBOARD_TEMPLATE = """\
+<!DOCTYPE html>
+<html lang="ru">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Telegram Post Bot - Панель управления</title>
+    <link rel="stylesheet" href="{{ css_url }}">
+</head>
+<body class="bg-gray-100 min-h-screen">
+    <div class="container mx-auto px-4 py-8">
+        <h1 class="text-3xl font-bold text-center mb-8 text-gray-800">
+            📱 Telegram Post Bot - Панель управления
+        </h1>
+
+        <div class="grid grid-cols-1 md:grid-cols-2 gap-6">
+            <!-- Логи -->
+            <div class="bg-white rounded-lg shadow-md p-6">
+                <h2 class="text-xl font-semibold mb-4 text-gray-700">📋 Последние логи</h2>
+                <div class="space-y-2 mb-4" id="logsContainer" style="max-height: 400px; overflow-y: auto;">
+                    <div class="text-sm text-gray-600">Загрузка логов...</div>
+                </div>
+                <button onclick="refreshLogs()"
+                    class="bg-blue-500 hover:bg-blue-600 text-white px-4 py-2 rounded text-sm">
+                    🔄 Обновить логи
+                </button>
+            </div>
+
+            <!-- Посты -->
+            <div class="bg-white rounded-lg shadow-md p-6">
+                <h2 class="text-xl font-semibold mb-4 text-gray-700">📁 Посты</h2>
+                <div class="space-y-2 mb-4" id="postsContainer" style="max-height: 400px; overflow-y: auto;">
+                    <div class="text-sm text-gray-600">Загрузка постов...</div>
+                </div>
+                <button onclick="refreshPosts()"
+                    class="bg-green-500 hover:bg-green-600 text-white px-4 py-2 rounded text-sm">
+                    🔄 Обновить посты
+                </button>
+            </div>
+        </div>
+
+        <!-- Детальная информация о посте -->
+        <div class="mt-6 bg-white rounded-lg shadow-md p-6 hidden" id="postDetail">
+            <h2 class="text-xl font-semibold mb-4 text-gray-700">📄 Детали поста</h2>
+            <div id="postContent" class="text-sm text-gray-600">
+                Выберите пост для просмотра деталей
+            </div>
+        </div>
+    </div>
+
+    <script src="{{ js_url }}" defer></script>
+</body>
+</html>
+"""
+
+# Набор утилитарных классов, которые использует панель (вместо Tailwind CDN)
+DASHBOARD_CSS = """\
+*, ::before, ::after { box-sizing: border-box; border: 0 solid #e5e7eb; }
+html { line-height: 1.5; -webkit-text-size-adjust: 100%; }
+body { margin: 0; font-family: ui-sans-serif, system-ui, -apple-system, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif; }
+h1, h2, h3, h4, p, pre { margin: 0; font-size: inherit; font-weight: inherit; }
+ul { margin: 0; padding: 0; }
+pre, .font-mono { font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, monospace; }
+button { font: inherit; color: inherit; background-color: transparent; padding: 0; cursor: pointer; }
+
+.container { width: 100%; }
+
+.hidden { display: none; }
+.grid { display: grid; }
+.grid-cols-1 { grid-template-columns: repeat(1, minmax(0, 1fr)); }
+.gap-6 { gap: 1.5rem; }
+.space-y-2 > * + * { margin-top: 0.5rem; }
+.min-h-screen { min-height: 100vh; }
+.mx-auto { margin-left: auto; margin-right: auto; }
+.mb-4 { margin-bottom: 1rem; }
+.mb-8 { margin-bottom: 2rem; }
+.mt-6 { margin-top: 1.5rem; }
+.p-2 { padding: 0.5rem; }
+.p-3 { padding: 0.75rem; }
+.p-6 { padding: 1.5rem; }
+.px-4 { padding-left: 1rem; padding-right: 1rem; }
+.py-2 { padding-top: 0.5rem; padding-bottom: 0.5rem; }
+.py-8 { padding-top: 2rem; padding-bottom: 2rem; }
+.overflow-x-auto { overflow-x: auto; }
+.cursor-pointer { cursor: pointer; }
+.list-disc { list-style-type: disc; }
+.list-inside { list-style-position: inside; }
+
+.rounded { border-radius: 0.25rem; }
+.rounded-lg { border-radius: 0.5rem; }
+.border-l-4 { border-left-width: 4px; }
+.border-red-500 { border-color: #ef4444; }
+.border-yellow-500 { border-color: #eab308; }
+.border-blue-500 { border-color: #3b82f6; }
+.shadow-md { box-shadow: 0 4px 6px -1px rgb(0 0 0 / 0.1), 0 2px 4px -2px rgb(0 0 0 / 0.1); }
+
+.bg-white { background-color: #fff; }
+.bg-gray-50 { background-color: #f9fafb; }
+.bg-gray-100 { background-color: #f3f4f6; }
+.bg-blue-500 { background-color: #3b82f6; }
+.bg-green-500 { background-color: #22c55e; }
+.hover\\:bg-gray-100:hover { background-color: #f3f4f6; }
+.hover\\:bg-blue-600:hover { background-color: #2563eb; }
+.hover\\:bg-green-600:hover { background-color: #16a34a; }
+
+.text-center { text-align: center; }
+.text-xs { font-size: 0.75rem; line-height: 1rem; }
+.text-sm { font-size: 0.875rem; line-height: 1.25rem; }
+.text-lg { font-size: 1.125rem; line-height: 1.75rem; }
+.text-xl { font-size: 1.25rem; line-height: 1.75rem; }
+.text-3xl { font-size: 1.875rem; line-height: 2.25rem; }
+.font-semibold { font-weight: 600; }
+.font-bold { font-weight: 700; }
+.text-white { color: #fff; }
+.text-gray-500 { color: #6b7280; }
+.text-gray-600 { color: #4b5563; }
+.text-gray-700 { color: #374151; }
+.text-gray-800 { color: #1f2937; }
+.text-red-500 { color: #ef4444; }
+
+/* Адаптивные варианты идут после базовых классов, иначе базовые их перекрывают */
+@media (min-width: 640px) { .container { max-width: 640px; } }
+@media (min-width: 768px) { .container { max-width: 768px; } .md\\:grid-cols-2 { grid-template-columns: repeat(2, minmax(0, 1fr)); } }
+@media (min-width: 1024px) { .container { max-width: 1024px; } }
+@media (min-width: 1280px) { .container { max-width: 1280px; } }
+"""
+
+DASHBOARD_JS = """\
+function refreshLogs() {
+    fetch('/api/logs')
+        .then(response => response.json())
+        .then(data => {
+            const container = document.getElementById('logsContainer');
+            container.innerHTML = '';
+            data.logs.forEach(log => {
+                const div = document.createElement('div');
+                div.className = 'text-xs p-2 bg-gray-50 rounded border-l-4 ' +
+                    (log.level === 'ERROR' ? 'border-red-500' :
+                     log.level === 'WARNING' ? 'border-yellow-500' : 'border-blue-500');
+                div.innerHTML = `
+                    <div class="font-mono text-gray-500">${log.time}</div>
+                    <div class="font-semibold text-gray-700">${log.level}</div>
+                    <div class="text-gray-600">${log.message}</div>
+                `;
+                container.appendChild(div);
+            });
+        })
+        .catch(error => {
+            console.error('Ошибка загрузки логов:', error);
+            document.getElementById('logsContainer').innerHTML =
+                '<div class="text-red-500 text-sm">Ошибка загрузки логов</div>';
+        });
+}
+
+function refreshPosts() {
+    fetch('/api/posts')
+        .then(response => response.json())
+        .then(data => {
+            const container = document.getElementById('postsContainer');
+            container.innerHTML = '';
+            data.posts.forEach(post => {
+                const div = document.createElement('div');
+                div.className = 'text-sm p-3 bg-gray-50 rounded cursor-pointer hover:bg-gray-100';
+                div.onclick = () => showPostDetail(post.name);
+                div.innerHTML = `
+                    <div class="font-semibold text-gray-700">${post.name}</div>
+                    <div class="text-gray-500">${post.created}</div>
+                    <div class="text-gray-600">${post.files_count} файлов</div>
+                `;
+                container.appendChild(div);
+            });
+        })
+        .catch(error => {
+            console.error('Ошибка загрузки постов:', error);
+            document.getElementById('postsContainer').innerHTML =
+                '<div class="text-red-500 text-sm">Ошибка загрузки постов</div>';
+        });
+}
+
+function showPostDetail(postName) {
+    fetch(`/api/posts/${postName}`)
+        .then(response => response.json())
+        .then(data => {
+            const detailDiv = document.getElementById('postDetail');
+            const contentDiv = document.getElementById('postContent');
+
+            detailDiv.classList.remove('hidden');
+            contentDiv.innerHTML = `
+                <div class="mb-4">
+                    <h3 class="font-semibold text-lg">${data.name}</h3>
+                    <p class="text-gray-500">Создано: ${data.created}</p>
+                </div>
+                <div class="mb-4">
+                    <h4 class="font-semibold">Содержимое:</h4>
+                    <pre class="bg-gray-50 p-3 rounded text-xs overflow-x-auto">${data.content}</pre>
+                </div>
+                ${data.files.length > 0 ? `
+                <div>
+                    <h4 class="font-semibold">Файлы:</h4>
+                    <ul class="list-disc list-inside">
+                        ${data.files.map(file => `<li>${file}</li>`).join('')}
+                    </ul>
+                </div>
+                ` : ''}
+            `;
+        })
+        .catch(error => {
+            console.error('Ошибка загрузки деталей поста:', error);
+            document.getElementById('postContent').innerHTML =
+                '<div class="text-red-500 text-sm">Ошибка загрузки деталей поста</div>';
+        });
+}
+
+// Автообновление каждые 30 секунд
+setInterval(() => {
+    refreshLogs();
+    refreshPosts();
+}, 30000);
+
+// Первоначальная загрузка
+refreshLogs();
+refreshPosts();
+"""
+
+
+class StaticAsset:
+    """Неизменяемый ответ веб-сервера, заранее сжатый gzip и brotli"""
+
+    def __init__(self, body: bytes, content_type: str):
+        self.body = body
+        self.content_type = content_type
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        self.encoded = {'gzip': gzip.compress(body, compresslevel=9)}
+        if importlib.util.find_spec('brotli') is not None:
+            import brotli
+            self.encoded['br'] = brotli.compress(body, quality=11)
+
+    def select(self, accept_encoding: str):
+        """Возвращает (кодировка, тело) с учетом Accept-Encoding клиента"""
+        accepted = {part.split(';')[0].strip() for part in (accept_encoding or '').split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.encoded:
+                return encoding, self.encoded[encoding]
+        return None, self.body
+
 
 # Веб-интерфейс для просмотра логов и постов
 class WebInterface:
     def __init__(self, post_bot):
         self.post_bot = post_bot
-        self.app = Flask(__name__)
+        self.app = Flask(__name__, static_folder=None)
+        self._build_assets()
         self._setup_routes()
 
+    def _build_assets(self):
+        """Собирает панель управления один раз при запуске"""
+        self.assets = {}
+        urls = {}
+        for key, source, extension, content_type in (
+                ('css_url', DASHBOARD_CSS, 'css', 'text/css; charset=utf-8'),
+                ('js_url', DASHBOARD_JS, 'js', 'application/javascript; charset=utf-8')):
+            static_asset = StaticAsset(source.encode('utf-8'), content_type)
+            name = f"dashboard.{static_asset.etag}.{extension}"
+            self.assets[name] = static_asset
+            urls[key] = f"/assets/{name}"
+
+        template = self.app.jinja_env.from_string(DASHBOARD_TEMPLATE)
+        self.index_asset = StaticAsset(template.render(**urls).encode('utf-8'), 'text/html; charset=utf-8')
+
+    def _asset_response(self, static_asset: StaticAsset, cache_control: str):
+        """Отдает заранее сжатый ассет с заголовками кеширования"""
+        etag = f'"{static_asset.etag}"'
+        headers = {'ETag': etag, 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers=headers)
+
+        encoding, body = static_asset.select(request.headers.get('Accept-Encoding'))
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return Response(body, content_type=static_asset.content_type, headers=headers)
+
+    def _check_admin(self):
+        """Проверяет токен администратора. Возвращает ответ с ошибкой или None"""
+        token = self.post_bot.config.web_admin_token
+        if not token:
+            return jsonify({'error': 'Управление через веб-интерфейс отключено: не задан WEB_ADMIN_TOKEN'}), 403
+        supplied = request.headers.get('X-Admin-Token', '')
+        authorization = request.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            supplied = authorization[len('Bearer '):]
+        if not hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8')):
+            return jsonify({'error': 'Неверный токен администратора'}), 401
+        return None
+
     def _setup_routes(self):
         @self.app.route('/')
         def index():
-            html_template = """
-            <!DOCTYPE html>
-            <html lang="ru">
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>Telegram Post Bot - Панель управления</title>
-                <script src="https://cdn.tailwindcss.com"></script>
-            </head>
-            <body class="bg-gray-100 min-h-screen">
-                <div class="container mx-auto px-4 py-8">
-                    <h1 class="text-3xl font-bold text-center mb-8 text-gray-800">
-                        📱 Telegram Post Bot - Панель управления
-                    </h1>
-
-                    <div class="grid grid-cols-1 md:grid-cols-2 gap-6">
-                        <!-- Логи -->
-                        <div class="bg-white rounded-lg shadow-md p-6">
-                            <h2 class="text-xl font-semibold mb-4 text-gray-700">📋 Последние логи</h2>
-                            <div class="space-y-2 mb-4" id="logsContainer" style="max-height: 400px; overflow-y: auto;">
-                                <div class="text-sm text-gray-600">Загрузка логов...</div>
-                            </div>
-                            <button onclick="refreshLogs()"
-                                class="bg-blue-500 hover:bg-blue-600 text-white px-4 py-2 rounded text-sm">
-                                🔄 Обновить логи
-                            </button>
-                        </div>
-
-                        <!-- Посты -->
-                        <div class="bg-white rounded-lg shadow-md p-6">
-                            <h2 class="text-xl font-semibold mb-4 text-gray-700">📁 Посты</h2>
-                            <div class="space-y-2 mb-4" id="postsContainer" style="max-height: 400px; overflow-y: auto;">
-                                <div class="text-sm text-gray-600">Загрузка постов...</div>
-                            </div>
-                            <button onclick="refreshPosts()"
-                                class="bg-green-500 hover:bg-green-600 text-white px-4 py-2 rounded text-sm">
-                                🔄 Обновить посты
-                            </button>
-                        </div>
-                    </div>
-
-                    <!-- Детальная информация о посте -->
-                    <div class="mt-6 bg-white rounded-lg shadow-md p-6 hidden" id="postDetail">
-                        <h2 class="text-xl font-semibold mb-4 text-gray-700">📄 Детали поста</h2>
-                        <div id="postContent" class="text-sm text-gray-600">
-                            Выберите пост для просмотра деталей
-                        </div>
-                    </div>
-                </div>
-
-                <script>
-                    function refreshLogs() {
-                        fetch('/api/logs')
-                            .then(response => response.json())
-                            .then(data => {
-                                const container = document.getElementById('logsContainer');
-                                container.innerHTML = '';
-                                data.logs.forEach(log => {
-                                    const div = document.createElement('div');
-                                    div.className = 'text-xs p-2 bg-gray-50 rounded border-l-4 ' +
-                                        (log.level === 'ERROR' ? 'border-red-500' :
-                                         log.level === 'WARNING' ? 'border-yellow-500' : 'border-blue-500');
-                                    div.innerHTML = `
-                                        <div class="font-mono text-gray-500">${log.time}</div>
-                                        <div class="font-semibold text-gray-700">${log.level}</div>
-                                        <div class="text-gray-600">${log.message}</div>
-                                    `;
-                                    container.appendChild(div);
-                                });
-                            })
-                            .catch(error => {
-                                console.error('Ошибка загрузки логов:', error);
-                                document.getElementById('logsContainer').innerHTML =
-                                    '<div class="text-red-500 text-sm">Ошибка загрузки логов</div>';
-                            });
-                    }
-
-                    function refreshPosts() {
-                        fetch('/api/posts')
-                            .then(response => response.json())
-                            .then(data => {
-                                const container = document.getElementById('postsContainer');
-                                container.innerHTML = '';
-                                data.posts.forEach(post => {
-                                    const div = document.createElement('div');
-                                    div.className = 'text-sm p-3 bg-gray-50 rounded cursor-pointer hover:bg-gray-100';
-                                    div.onclick = () => showPostDetail(post.name);
-                                    div.innerHTML = `
-                                        <div class="font-semibold text-gray-700">${post.name}</div>
-                                        <div class="text-gray-500">${post.created}</div>
-                                        <div class="text-gray-600">${post.files_count} файлов</div>
-                                    `;
-                                    container.appendChild(div);
-                                });
-                            })
-                            .catch(error => {
-                                console.error('Ошибка загрузки постов:', error);
-                                document.getElementById('postsContainer').innerHTML =
-                                    '<div class="text-red-500 text-sm">Ошибка загрузки постов</div>';
-                            });
-                    }
-
-                    function showPostDetail(postName) {
-                        fetch(`/api/posts/${postName}`)
-                            .then(response => response.json())
-                            .then(data => {
-                                const detailDiv = document.getElementById('postDetail');
-                                const contentDiv = document.getElementById('postContent');
-
-                                detailDiv.classList.remove('hidden');
-                                contentDiv.innerHTML = `
-                                    <div class="mb-4">
-                                        <h3 class="font-semibold text-lg">${data.name}</h3>
-                                        <p class="text-gray-500">Создано: ${data.created}</p>
-                                    </div>
-                                    <div class="mb-4">
-                                        <h4 class="font-semibold">Содержимое:</h4>
-                                        <pre class="bg-gray-50 p-3 rounded text-xs overflow-x-auto">${data.content}</pre>
-                                    </div>
-                                    ${data.files.length > 0 ? `
-                                    <div>
-                                        <h4 class="font-semibold">Файлы:</h4>
-                                        <ul class="list-disc list-inside">
-                                            ${data.files.map(file => `<li>${file}</li>`).join('')}
-                                        </ul>
-                                    </div>
-                                    ` : ''}
-                                `;
-                            })
-                            .catch(error => {
-                                console.error('Ошибка загрузки деталей поста:', error);
-                                document.getElementById('postContent').innerHTML =
-                                    '<div class="text-red-500 text-sm">Ошибка загрузки деталей поста</div>';
-                            });
-                    }
-
-                    // Автообновление каждые 30 секунд
-                    setInterval(() => {
-                        refreshLogs();
-                        refreshPosts();
-                    }, 30000);
-
-                    // Первоначальная загрузка
-                    refreshLogs();
-                    refreshPosts();
-                </script>
-            </body>
-            </html>
-            """
-            return render_template_string(html_template)
+            # Кешируется браузером, но проверяется по ETag: после деплоя нужны новые хеши ассетов
+            return self._asset_response(self.index_asset, 'no-cache')
+
+        @self.app.route('/assets/<name>')
+        def asset(name):
+            static_asset = self.assets.get(name)
+            if static_asset is None:
+                return jsonify({'error': 'Not found'}), 404
+            # Имя содержит хеш содержимого, поэтому файл можно кешировать навсегда
+            return self._asset_response(static_asset, 'public, max-age=31536000, immutable')
+
+        @self.app.route('/healthz')
+        def healthz():
+            healthy, details = self.post_bot.health()
+            response = jsonify({'status': 'ok' if healthy else 'unhealthy', **details})
+            response.headers['Cache-Control'] = 'no-store'
+            return response, 200 if healthy else 503
+
+        @self.app.route('/readyz')
+        def readyz():
+            ready, details = self.post_bot.readiness()
+            response = jsonify({'status': 'ready' if ready else 'not ready', **details})
+            response.headers['Cache-Control'] = 'no-store'
+            return response, 200 if ready else 503
+
+        @self.app.route('/api/startup')
+        def get_startup_profile():
+            return jsonify(startup_profile.as_dict())
+
+        @self.app.route('/api/traces')
+        def get_traces():
+            return jsonify({
+                'enabled': tracer.enabled,
+                'slow_handler_ms': tracer.slow_ms,
+                'traces': tracer.snapshot(),
+            })
+
+        @self.app.route('/api/tracing', methods=['POST'])
+        def set_tracing():
+            denied = self._check_admin()
+            if denied:
+                return denied
+            tracer.enabled = request.args.get('enabled', '1').lower() in ('1', 'true', 'yes', 'on')
+            return jsonify({'enabled': tracer.enabled})
+
+        @self.app.route('/api/profile', methods=['GET', 'POST'])
+        def profile():
+            config = self.post_bot.config
+            if request.method == 'POST':
+                denied = self._check_admin()
+                if denied:
+                    return denied
+                try:
+                    seconds = float(request.args.get('seconds', 30))
+                    if not math.isfinite(seconds) or seconds <= 0:
+                        raise ValueError(seconds)
+                    seconds = min(seconds, config.profile_max_seconds)
+                    path = profiler.start(seconds, config.profile_interval, config.profile_dir)
+                except ValueError:
+                    return jsonify({'error': 'Некорректное значение seconds'}), 400
+                except RuntimeError as e:
+                    return jsonify({'error': str(e)}), 409
+                return jsonify({'running': True, 'seconds': seconds, 'file': path}), 202
+
+            files = []
+            if os.path.isdir(config.profile_dir):
+                files = sorted(f for f in os.listdir(config.profile_dir) if f.endswith('.folded'))
+            return jsonify({'running': profiler.running, 'file': profiler.current_file, 'files': files})
 
         @self.app.route('/api/logs')
         def get_logs():
@@ -638,6 +2158,25 @@ class WebInterface:
             except Exception as e:
                 return jsonify({'error': str(e)}), 500
 
+        @self.app.route('/api/posts/<post_name>/approve', methods=['POST'])
+        def approve_post(post_name):
+            denied = self._check_admin()
+            if denied:
+                return denied
+            try:
+                added = self.post_bot.approve_post(post_name)
+                return jsonify({'queued': added, 'depth': self.post_bot.publish_queue.depth})
+            except FileNotFoundError:
+                return jsonify({'error': 'Пост не найден'}), 404
+            except PostNotReady:
+                return jsonify({'error': 'Пост еще сохраняется'}), 409
+            except Exception as e:
+                return jsonify({'error': str(e)}), 500
+
+        @self.app.route('/api/queue')
+        def get_queue():
+            return jsonify(self.post_bot.publish_queue.status())
+
     def run_web_server(self, host='0.0.0.0', port=None):
         """Запуск веб-сервера в отдельном потоке"""
         if port is None:
@@ -655,8 +2194,9 @@ def signal_handler(signum, frame):
     sys.exit(0)
 
 # Регистрируем обработчики сигналов
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
+if not _IS_POOL_WORKER:
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
 
 async def main():
     """Основная функция запуска бота"""
@@ -671,16 +2211,18 @@ async def main():
 
     bot = PostBot(token)
     bot_instance = bot
+    startup_profile.mark("config")
 
     # Создаем веб-интерфейс
     web_interface = WebInterface(bot)
 
-    # Запускаем веб-сервер в отдельном потоке
+    # Запускаем веб-сервер в отдельном потоке - пробы отвечают еще до подключения к Telegram
     web_thread = threading.Thread(
         target=web_interface.run_web_server,
         daemon=True
     )
     web_thread.start()
+    startup_profile.mark("web server")
 
     port = int(os.environ.get('PORT', 8080))
     logger.info(f"🌐 Веб-интерфейс запущен на http://0.0.0.0:{port}")